@@ -1,8 +1,11 @@
 # example_register_via_local_node.py
+import asyncio
+import gc
 import time
 import os
+import queue
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 import bittensor as bt
 from dotenv import load_dotenv
 
@@ -14,85 +17,128 @@ RPC_ENDPOINT = os.getenv("RPC_ENDPOINT")  # local lite node rpc/ws
 NETUID = 1                    # target subnet id
 COLDKEY_NAMES = [f"cold_{i}" for i in range(1, 11)]  # names in your keystore or mnemonics
 BROADCAST_TIMEOUT = 3.0       # seconds (your "3 second" race window)
-MAX_WORKERS = 8               # cap on parallel submissions
+MAX_WORKERS = 8               # cap on concurrent submissions
 USE_EPOCH_START = True        # race on first block of the next epoch
 BLOCK_TIME = 12.0             # seconds per block (approx)
 TIP = 0.01                    # tip to raise priority
-MAX_ALLOWED_ATTEMPTS = 3     # max attempts to register
+PIN_CORE = -1                 # index into the allowed cores for the submission loop (-1: last, as in monkey.py)
+WALLET_PATH = os.path.expanduser("~/.bittensor/wallets")  # default SDK keystore location
 
-def load_wallet(name):
+@lru_cache(maxsize=None)
+def load_wallet(name, hotkey=None):
     # This assumes you have wallet keystores already available to the SDK by name.
     # If you use mnemonics, load from env and create wallet programmatically instead.
-    # Optionally, you can pass hotkey=name if you keep one hotkey per wallet name.
-    try:
-        w = bt.wallet(name=name)
-    except Exception:
-        # Fallback to hotkey=name if required by local keystore layout
-        w = bt.wallet(name=name, hotkey=name)
-    return w
-
+    # Without an explicit hotkey, use 'default' if that keyfile exists, otherwise
+    # the one-hotkey-per-wallet layout where the hotkey is named after the wallet.
+    if hotkey is None:
+        default_path = os.path.join(WALLET_PATH, name, "hotkeys", "default")
+        hotkey = "default" if os.path.isfile(default_path) else name
+    return bt.wallet(name=name, hotkey=hotkey)
 
-def _get_registration_cost(subtensor, netuid):
-    # Confirmed SDK method for burn/registration cost
-    return subtensor.get_subnet_burn_cost(netuid)
 
-
-def _get_wallet_balance(subtensor, wallet):
-    # Confirmed SDK method via subtensor using coldkeypub address
-    try:
-        address = wallet.coldkeypub.ss58_address
-    except Exception:
-        return None
+def _get_startup_state(subtensor, netuid, cold_addrs):
+    # Burn cost, tempo, current block and every coldkey's free balance (rao, by wallet name)
+    # from a single state_queryStorageAt; (None, None, None, {}) if the batch fails
+    substrate = subtensor.substrate
     try:
-        return subtensor.get_balance(address)
+        burn_key = substrate.create_storage_key("SubtensorModule", "Burn", [netuid])
+        tempo_key = substrate.create_storage_key("SubtensorModule", "Tempo", [netuid])
+        number_key = substrate.create_storage_key("System", "Number")
+        account_keys = {
+            addr: substrate.create_storage_key("System", "Account", [addr])
+            for addr in set(cold_addrs.values())
+        }
+        keys = [burn_key, tempo_key, number_key, *account_keys.values()]
+        values = {key.to_hex(): value for key, value in substrate.query_multi(keys)}
     except Exception:
-        return None
+        return None, None, None, {}
+    burn = values.get(burn_key.to_hex())
+    burn_cost = bt.Balance.from_rao(int(burn)) if burn is not None else None
+    balances = {}
+    for name, addr in cold_addrs.items():
+        account = values.get(account_keys[addr].to_hex()) or {"data": {"free": 0}}
+        balances[name] = int(account["data"]["free"])
+    return burn_cost, values.get(tempo_key.to_hex()), values.get(number_key.to_hex()), balances
 
 
-def _compare_balances(a, b):
-    # Attempt direct comparison (bittensor.Balance supports comparisons)
+def _pin_current_thread(core_index=-1):
+    # Pin the submission loop to one allowed core (the last by default, away from core 0's
+    # interrupt load) to avoid migration jitter, and raise its priority if we are permitted to
     try:
-        return a < b
-    except Exception:
-        pass
-    # Convert to float if possible
-    def to_float(x):
-        try:
-            if hasattr(x, "tao"):
-                return float(x.tao)
-        except Exception:
-            pass
-        try:
-            return float(str(x).split()[0])
-        except Exception:
-            return 0.0
-    return to_float(a) < to_float(b)
+        cores = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cores[core_index % len(cores)]})
+    except (AttributeError, OSError):
+        pass  # not available on this platform
+    try:
+        os.nice(-5)
+    except OSError:
+        pass  # needs CAP_SYS_NICE
 
 
-def _try_register(subtensor, wallet, netuid):
-    # Use confirmed fastest path with minimal arguments
+async def _try_register(subtensor, wallet, netuid):
+    # Compose, sign and submit on the shared connection; AsyncSubtensor.burned_register
+    # closes the socket on exit, which would cut off every other in-flight submission
     try:
-        res = subtensor.burned_register(
-          wallet=wallet,
-          netuid=netuid,
-          wait_for_finalization=False,
-          max_allowed_attempts=MAX_ALLOWED_ATTEMPTS,
-          tip=TIP
+        substrate = subtensor.substrate
+        call = await substrate.compose_call(
+            call_module="SubtensorModule",
+            call_function="burned_register",
+            call_params={"netuid": netuid, "hotkey": wallet.hotkey.ss58_address},
         )
-        return True, res
+        extrinsic = await substrate.create_signed_extrinsic(
+            call=call, keypair=wallet.coldkey, tip=bt.Balance.from_tao(TIP).rao
+        )
+        receipt = await substrate.submit_extrinsic(extrinsic, wait_for_finalization=False)
+        return True, receipt.extrinsic_hash
     except Exception as e:
         return False, str(e)
 
 
-def _get_uid_for_hotkey(subtensor, hot_ss58, netuid):
-    try:
-        return subtensor.get_uid_for_hotkey_on_subnet(hot_ss58, netuid)
-    except Exception:
+def _uid_storage_keys(subtensor, hot_addrs, netuid):
+    # SubtensorModule.Uids(netuid, hotkey) for each hotkey, built once before the race
+    return [
+        subtensor.substrate.create_storage_key("SubtensorModule", "Uids", [netuid, hot])
+        for hot in hot_addrs
+    ]
+
+
+def _query_uids(subtensor, storage_keys):
+    # One state_queryStorageAt round-trip for every watched hotkey
+    return {key.params[1]: uid for key, uid in subtensor.substrate.query_multi(storage_keys)}
+
+
+def _poll_for_registration(subtensor, storage_keys, on_registered, stop_event):
+    # Batched polling: one Uids read for all hotkeys every 200ms until stop_event is set
+    while not stop_event.is_set():
         try:
-            ok = subtensor.is_hotkey_registered_on_subnet(hot_ss58, netuid)
-            return 1 if ok else None
+            uids = _query_uids(subtensor, storage_keys) if storage_keys else {}
         except Exception:
+            uids = {}
+        for hot, uid in uids.items():
+            if uid is not None:
+                on_registered(hot, uid)
+                break
+        stop_event.wait(timeout=0.2)
+
+
+def _watch_for_registration(subtensor, storage_keys, on_registered, stop_event):
+    # The node pushes every change to the watched Uids keys; stop at the first assigned UID,
+    # or on the first update after stop_event is set (e.g. a re-subscribe after a recv timeout)
+    def handler(storage_key, obj, subscription_id):
+        if stop_event.is_set():
+            return True
+        uid = getattr(obj, "value", obj)
+        if uid is None:
             return None
+        on_registered(storage_key.params[1], uid)
+        return True  # not the UID itself: 0 is a valid UID but reads as "not done"
+    if stop_event.is_set():
+        return
+    try:
+        subtensor.substrate.subscribe_storage(storage_keys, handler)
+    except Exception:
+        # Subscription unavailable or dropped: keep checking by polling until the window closes
+        _poll_for_registration(subtensor, storage_keys, on_registered, stop_event)
 
 
 def _get_current_block(subtensor):
@@ -103,20 +149,48 @@ def _get_current_block(subtensor):
         return None
 
 
-def _wait_for_next_epoch_start(subtensor):
-    # Poll block height and wait until the first block of the next epoch
-    block = _get_current_block(subtensor)
-    metagraph = subtensor.metagraph(netuid=NETUID)
-    epoch_length = metagraph.tempo
-    
-    if block is None:
-        return  # cannot sync to epoch, fall back to immediate start
-    remainder = block % epoch_length
-    blocks_until = (epoch_length - remainder) % epoch_length
-    target_block = block + blocks_until
-    if blocks_until == 0:
-        # Already at epoch boundary, trigger immediately
-        return
+@lru_cache(maxsize=None)
+def _get_tempo(subtensor, netuid):
+    # Read only SubtensorModule.Tempo instead of decoding a full metagraph; constant per run
+    return subtensor.substrate.query("SubtensorModule", "Tempo", [netuid]).value
+
+
+def _subscriptions_supported():
+    # Header subscriptions need a websocket endpoint; plain http RPC can only be polled
+    return not (RPC_ENDPOINT or "").startswith("http")
+
+
+def _subscribe_until_block(target_block):
+    # chain_subscribeNewHeads pushes each header number onto a queue; return as soon as the
+    # target arrives, or None if no header shows up for BLOCK_TIME*2 so the caller can poll.
+    # The subscription gets its own connection and thread, so a stalled one can simply be
+    # abandoned without a second thread ever reading the caller's socket.
+    headers = queue.Queue()
+
+    def handler(obj, *_):
+        number = obj["header"]["number"]
+        headers.put(number)
+        if number >= target_block:
+            return number
+        return None
+
+    def subscribe():
+        try:
+            bt.subtensor(network=NET, endpoint=RPC_ENDPOINT).substrate.subscribe_block_headers(handler)
+        except Exception:
+            headers.put(None)
+
+    threading.Thread(target=subscribe, daemon=True).start()
+    while True:
+        try:
+            number = headers.get(timeout=BLOCK_TIME * 2)
+        except queue.Empty:
+            return None  # stalled
+        if number is None or number >= target_block:
+            return number
+
+
+def _poll_until_block(subtensor, target_block):
     # Coarse wait until within one block of target
     while True:
         now_block = _get_current_block(subtensor)
@@ -134,33 +208,39 @@ def _wait_for_next_epoch_start(subtensor):
             break
         time.sleep(0.01)
 
+
+def _wait_for_next_epoch_start(subtensor, block=None, epoch_length=None):
+    # Wait until the first block of the next epoch; block/tempo are fetched if not supplied
+    if block is None:
+        block = _get_current_block(subtensor)
+    if epoch_length is None:
+        epoch_length = _get_tempo(subtensor, NETUID)
+    
+    if block is None:
+        return  # cannot sync to epoch, fall back to immediate start
+    remainder = block % epoch_length
+    blocks_until = (epoch_length - remainder) % epoch_length
+    target_block = block + blocks_until
+    if blocks_until == 0:
+        # Already at epoch boundary, trigger immediately
+        return
+    if _subscriptions_supported() and _subscribe_until_block(target_block) is not None:
+        return
+    # Subscription unavailable (http endpoint, dropped socket or stalled headers): poll instead
+    _poll_until_block(subtensor, target_block)
+
 def main():
     print(RPC_ENDPOINT)
-    subtensor = bt.subtensor(network=NET, endpoint=RPC_ENDPOINT)
-    # fetch burn cost once (robust across SDK versions)
-    burn_cost = _get_registration_cost(subtensor, NETUID)
-    print("Burn cost:", burn_cost)
-    
-    # Optionally sync to next epoch boundary for best chance
-    if USE_EPOCH_START:
-        print("Waiting for next epoch boundary to start submissions...")
-        # EPOCH_LENGTH = subtensor.blocks_per_epoch(netuid=NETUID)
-        _wait_for_next_epoch_start(subtensor)
+    # Separate connections so submissions never queue behind monitoring RPCs on the same socket:
+    # monitor_subtensor serves the startup reads, epoch wait and UID watch, while the registrations
+    # go through submit_subtensor (opened in race() below). That one is async, so the submissions
+    # share its socket as multiplexed requests rather than contending for a sync recv()
+    monitor_subtensor = bt.subtensor(network=NET, endpoint=RPC_ENDPOINT)
 
     wallets = []
     for n in COLDKEY_NAMES:
         try:
-            w = load_wallet(n)
-            # Ensure we have a hotkey loaded; many SDK ops require it
-            try:
-                _ = w.hotkey.ss58_address
-            except Exception:
-                # Try loading with hotkey=name as fallback
-                try:
-                    w = bt.wallet(name=n, hotkey=n)
-                except Exception:
-                    pass
-            wallets.append(w)
+            wallets.append(load_wallet(n))
         except Exception as e:
             print("Could not load wallet", n, e)
 
@@ -168,67 +248,115 @@ def main():
         print("No wallets loaded. Exiting.")
         return
 
-    start_time = time.time()
-    end_time = start_time + BROADCAST_TIMEOUT
+    # Resolve key addresses once; wallet.hotkey / wallet.coldkeypub go back to the keyfiles on access
+    hot_addrs = {}
+    cold_addrs = {}
+    for w in wallets:
+        try:
+            hot_addrs[w.name] = w.hotkey.ss58_address
+        except Exception:
+            pass
+        try:
+            cold_addrs[w.name] = w.coldkeypub.ss58_address
+        except Exception:
+            pass
+
+    # Burn cost, tempo, current block and all balances in one round-trip, so the race
+    # itself makes no balance RPCs
+    burn_cost, epoch_length, block, balances = _get_startup_state(monitor_subtensor, NETUID, cold_addrs)
+    print("Burn cost:", burn_cost)
+    # Compare plain rao ints in the race instead of Balance objects
+    burn_cost_rao = int(burn_cost.rao) if burn_cost is not None else None
+    
+    # Hotkeys whose UID assignment signals a successful registration
+    watched = {hot: name for name, hot in hot_addrs.items()}
+    uid_keys = _uid_storage_keys(monitor_subtensor, list(watched), NETUID)
+    use_subscription = _subscriptions_supported() and bool(uid_keys)
 
     submitted = []
-    submitted_lock = threading.Lock()
     success = None
     success_lock = threading.Lock()
+    # Set on success, or by the deadline timer when the broadcast window closes
     success_event = threading.Event()
+    # Submission messages are buffered as (monotonic time, text) and printed after the race,
+    # keeping stdout flush syscalls out of the broadcast window
+    race_log = []
+
+    def mark_success(name, uid):
+        nonlocal success
+        with success_lock:
+            if not success_event.is_set():
+                success = (name, uid)
+                success_event.set()
 
-    def submit_one(wallet):
-        if success_event.is_set() or time.time() > end_time:
+    def on_registered(hot, uid):
+        mark_success(watched[hot], uid)
+
+    async def submit_one(subtensor, wallet, limit):
+        if success_event.is_set():
             return None
-        try:
-            bal = _get_wallet_balance(subtensor, wallet)
-        except Exception:
-            bal = None
+        bal = balances.get(wallet.name)
         if bal is None:
-            print(f"{wallet.name} balance unknown, attempting anyway.")
-        elif _compare_balances(bal, burn_cost):
-            print(f"{wallet.name} insufficient balance {bal} < {burn_cost}, skipping.")
+            race_log.append((time.monotonic(), f"{wallet.name} balance unknown, attempting anyway."))
+        elif burn_cost_rao is not None and bal < burn_cost_rao:
+            race_log.append((time.monotonic(), f"{wallet.name} insufficient balance {bt.Balance.from_rao(bal)} < {burn_cost}, skipping."))
             return None
-        ok, info = _try_register(subtensor, wallet, NETUID)
-        with submitted_lock:
-            submitted.append((wallet.name, ok, info))
+        async with limit:
+            ok, info = await _try_register(subtensor, wallet, NETUID)
+        submitted.append((wallet.name, ok, info))
         if ok:
-            print(f"Submitted for {wallet.name}: {info}")
+            race_log.append((time.monotonic(), f"Submitted for {wallet.name}: {info}"))
         else:
-            print(f"Submit error for {wallet.name}: {info}")
+            race_log.append((time.monotonic(), f"Submit error for {wallet.name}: {info}"))
         return info
 
-    # Prepare and broadcast in rapid succession (parallelized)
-    max_workers = min(MAX_WORKERS, max(1, len(wallets)))
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = []
-        for wallet in wallets:
-            if time.time() > end_time:
-                break
-            futures.append(executor.submit(submit_one, wallet))
-
-        # Monitor submitted txs / chain state for success until timeout or success
-        while time.time() < end_time and not success_event.is_set():
-            for w in wallets:
-                try:
-                    hot = w.hotkey.ss58_address
-                except Exception:
-                    continue
-                try:
-                    uid = _get_uid_for_hotkey(subtensor, hot, NETUID)
-                except Exception:
-                    uid = None
-                if uid is not None and uid != 0:
-                    with success_lock:
-                        if not success_event.is_set():
-                            success = (w.name, uid)
-                            success_event.set()
-                    break
-            time.sleep(0.2)
-
-        # Drain futures
-        for _ in as_completed(futures):
-            pass
+    async def race():
+        # One AsyncSubtensor carries every submission: its websocket multiplexes concurrent
+        # requests, which the sync client cannot do across threads. Connect (and load metadata)
+        # before the epoch wait and keep the socket open through it instead of the 5s default.
+        submit_subtensor = bt.AsyncSubtensor(
+            network=RPC_ENDPOINT or NET,
+            websocket_shutdown_timer=((epoch_length or 360) + 1) * BLOCK_TIME,
+        )
+        await submit_subtensor.initialize()
+        try:
+            # Optionally sync to next epoch boundary for best chance
+            if USE_EPOCH_START:
+                print("Waiting for next epoch boundary to start submissions...")
+                # EPOCH_LENGTH = subtensor.blocks_per_epoch(netuid=NETUID)
+                await asyncio.to_thread(_wait_for_next_epoch_start, monitor_subtensor, block, epoch_length)
+
+            # Broadcast every wallet at once; the submissions interleave on the one socket
+            _pin_current_thread(PIN_CORE)
+            limit = asyncio.Semaphore(MAX_WORKERS)
+            deadline_timer = threading.Timer(BROADCAST_TIMEOUT, success_event.set)
+            deadline_timer.daemon = True
+            deadline_timer.start()
+            gc.disable()  # no collector pauses inside the race window
+            try:
+                submissions = asyncio.gather(*(submit_one(submit_subtensor, w, limit) for w in wallets))
+
+                # Monitor chain state for success until timeout or success
+                monitor = _watch_for_registration if use_subscription else _poll_for_registration
+                threading.Thread(
+                    target=monitor,
+                    args=(monitor_subtensor, uid_keys, on_registered, success_event),
+                    daemon=True,
+                ).start()
+                await asyncio.to_thread(success_event.wait)
+
+                # Drain submissions with a single wait
+                await submissions
+            finally:
+                gc.enable()
+            deadline_timer.cancel()
+        finally:
+            await submit_subtensor.close()
+
+    asyncio.run(race())
+
+    for _, msg in sorted(race_log):
+        print(msg)
 
     if success_event.is_set() and success:
         print("Registration succeeded for", success)
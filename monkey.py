@@ -11,10 +11,19 @@ The script:
   • Issues a burnedRegister extrinsic and waits for finalization.
 If the extrinsic succeeds it prints the new UID; otherwise prints the
 module error key.
+ 
+Optional speed-ups, picked up automatically when installed: uvloop for the
+event loop, and orjson/ujson for async_substrate_interface's frame decoding.
 """
-import argparse, getpass, sys, time, logging, traceback
+import argparse, asyncio, calendar, gc, getpass, os, sys, time, logging, traceback
 import bittensor as bt
 import datetime
+from async_substrate_interface import AsyncExtrinsicReceipt
+ 
+try:
+    import uvloop
+except ImportError:  # optional, falls back to the stock asyncio loop
+    uvloop = None
 
 
 def parse_args():
@@ -27,6 +36,7 @@ def parse_args():
     p.add_argument("--log_file", default="burn_register_miner.log", help="Path to logfile (default: burn_register_miner.log)")
     p.add_argument("--pre", type=float, default=1.0275, help="Seconds before block boundary to send tx (latency lead)")
     p.add_argument("--retry", type=int, default=48, help="Seconds after window start to keep retrying (default 48)")
+    p.add_argument("--pin_core", type=int, default=-1, help="Index into the allowed CPU set to pin the event loop to (default: -1, the last core)")
     p.add_argument("--last_reg_time_utc", default="2025-09-09 03:01:36", help="UTC timestamp of last successful registration (YYYY-MM-DD HH:MM:SS)")
     return p.parse_args()
  
@@ -67,6 +77,66 @@ def log(msg: str, level: str = "info"):
     getattr(logger, level)(msg)
  
  
+def pin_current_thread(core_index: int = -1):
+    """Pin the calling thread to one allowed core and raise its priority where permitted.
+    Keeps the scheduler from migrating the event loop between cores mid-race. Defaults to the
+    last allowed core, since core 0 usually takes the most interrupt and housekeeping work.
+    """
+    try:
+        cores = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cores[core_index % len(cores)]})
+    except (AttributeError, OSError):
+        pass  # not available on this platform
+    try:
+        os.nice(-5)
+    except OSError:
+        pass  # needs CAP_SYS_NICE
+ 
+ 
+_gc_holds = 0
+ 
+ 
+def pause_gc():
+    """Disable the cyclic collector until the returned release() is called (repeat calls are no-ops).
+    Holds are counted so overlapping attempts only re-enable it once the last one releases.
+    """
+    global _gc_holds
+    _gc_holds += 1
+    gc.disable()
+    released = False
+ 
+    def release():
+        global _gc_holds
+        nonlocal released
+        if released:
+            return
+        released = True
+        _gc_holds -= 1
+        if _gc_holds == 0:
+            gc.enable()
+ 
+    return release
+ 
+ 
+SPIN_S = 0.002  # final stretch busy-waited instead of slept
+ 
+ 
+async def precise_sleep_until(wall_deadline: float):
+    """Sleep until a time.time() deadline, spinning through the last SPIN_S to dodge timer-slack jitter.
+    The spin deliberately holds the event loop so nothing else gets scheduled ahead of the launch.
+    """
+    deadline = time.monotonic() + (wall_deadline - time.time())
+    coarse = deadline - time.monotonic() - SPIN_S
+    if coarse > 0:
+        await asyncio.sleep(coarse)
+    while time.monotonic() < deadline:
+        pass
+ 
+ 
+def fmt_utc(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime("%H:%M:%S.%f")
+ 
+ 
 def main():
     args = parse_args()
  
@@ -95,120 +165,208 @@ def main():
     root_logger.setLevel(logging.DEBUG)
     root_logger.addHandler(fh)
  
-    # Main connection for informational calls
-    sub = bt.Subtensor(network=args.network)
-    log(f"Connected to {args.network} – current block {sub.block}")
- 
-    # Pre-create one dedicated connection per wallet so that the costly
-    # WebSocket handshake is done **before** we enter the registration race.
-    subs_for_wallets = []
-    for _ in wallets:
-        s = bt.Subtensor(network=args.network)
-        # Touch the connection once to finish the handshake
-        try:
-            _ = s.get_current_block()
-        except Exception:
-            pass
-        subs_for_wallets.append(s)
- 
     CYCLE_BLOCKS = 360
     BLOCK_TIME_S = 12
+    # Sign each wallet's extrinsic this long before its launch, well after the previous
+    # wallet's tx (same coldkey) reached the pool; the nonce is then read fresh from the
+    # node's account_nextIndex, which counts pooled txs and any that never made it
+    PRESIGN_LEAD_S = BLOCK_TIME_S / 3
+    # Give up on an attempt that is not in a block after this long
+    ATTEMPT_TIMEOUT_S = 3 * BLOCK_TIME_S
+    cycle_seconds = CYCLE_BLOCKS * BLOCK_TIME_S
+    tip_rao = bt.Balance.from_tao(args.tip).rao
+ 
+    async def current_burn_cost(sub: bt.AsyncSubtensor):
+        try:
+            return await sub.recycle(args.netuid)
+        except Exception:
+            return None
  
-    def current_burn_cost():
+    async def presign_register(sub: bt.AsyncSubtensor, w: bt.wallet):
+        """Compose and sign the burned_register extrinsic ahead of the launch time.
+        Nonce lookup, SCALE encoding and signing are done here so the launch is a single submit.
+        Returns None if anything fails; the attempt then falls back to the SDK path.
+        """
         try:
-            return sub.burn(args.netuid)
+            substrate = sub.substrate
+            call = await substrate.compose_call(
+                call_module="SubtensorModule",
+                call_function="burned_register",
+                call_params={"netuid": args.netuid, "hotkey": w.hotkey.ss58_address},
+            )
+            # Not substrate.get_account_next_index(): the async client caches that per process
+            # and only increments it, so one lost tx would leave every later nonce gapped
+            nonce = (await substrate.rpc_request("account_nextIndex", [w.coldkeypub.ss58_address]))["result"]
+            return await substrate.create_signed_extrinsic(call=call, keypair=w.coldkey, nonce=nonce, tip=tip_rao)
         except Exception:
+            log(f"Pre-signing failed for hotkey {w.hotkey.ss58_address[:6]}…: {traceback.format_exc()}", "warning")
             return None
  
-    def attempt_with_wallet(w: bt.wallet, local_sub: bt.Subtensor) -> bool:
-        """Attempt registration with an isolated Subtensor connection.
-        Each thread maintains its own WebSocket to avoid concurrency errors inside
-        async_substrate_interface ("cannot call recv while another thread is already running").
+    async def submit_and_watch(sub: bt.AsyncSubtensor, w: bt.wallet, extrinsic, on_submitted=None) -> bool:
+        """Submit a pre-signed extrinsic via author_submitAndWatchExtrinsic and react to pushed status updates.
+        Returns as soon as the node reports the tx in a block (or drops it); success is confirmed by
+        reading the hotkey's UID at that block, and the block's events are only decoded on failure
+        to log the module error. on_submitted is called once the node first reports on the tx.
+        """
+        substrate = sub.substrate
+        outcome = {}
+ 
+        async def on_update(message, subscription_id):
+            if on_submitted is not None:
+                on_submitted()
+            status = message.get("params", {}).get("result")
+            if isinstance(status, dict):
+                status = {k.lower(): v for k, v in status.items()}
+            if isinstance(status, dict) and ("inblock" in status or "finalized" in status):
+                outcome["block_hash"] = status.get("inblock") or status["finalized"]
+            elif status in ("future", "dropped", "invalid") or (isinstance(status, dict) and "usurped" in status):
+                # "future" means a nonce gap: the tx cannot land until it is filled, so count it as failed
+                outcome["status"] = status
+            else:
+                return message, False
+            # Library unsubscribe also drops the subscription's receive queue
+            async with substrate.ws as ws:
+                await ws.unsubscribe(subscription_id)
+            return message, True
+ 
+        await substrate.rpc_request("author_submitAndWatchExtrinsic", [str(extrinsic.data)], result_handler=on_update)
+        block_hash = outcome.get("block_hash")
+        if block_hash is None:
+            log(f"burnedRegister from hotkey {w.hotkey.ss58_address[:6]}… not included: {outcome.get('status')}", "warning")
+            return False
+        uid = await substrate.query("SubtensorModule", "Uids", [args.netuid, w.hotkey.ss58_address], block_hash=block_hash)
+        if getattr(uid, "value", uid) is not None:
+            return True
+        receipt = AsyncExtrinsicReceipt(
+            substrate,
+            extrinsic_hash=f"0x{extrinsic.extrinsic_hash.hex()}",
+            block_hash=block_hash,
+        )
+        log(f"burnedRegister from hotkey {w.hotkey.ss58_address[:6]}… failed: {await receipt.error_message}", "warning")
+        return False
+ 
+    async def attempt_with_wallet(sub: bt.AsyncSubtensor, w: bt.wallet, extrinsic=None, on_submitted=None) -> bool:
+        """Attempt registration over the shared AsyncSubtensor connection.
+        async_substrate_interface multiplexes concurrent requests on one WebSocket, so
+        attempts no longer need a dedicated connection (or thread) each.
         """
         try:
             log(f"Sending burnedRegister from hotkey {w.hotkey.ss58_address[:6]}…")
-            return local_sub.burned_register(
-                wallet=w,
-                netuid=args.netuid,
-                wait_for_inclusion=True,
-                wait_for_finalization=False
-            )
+            if extrinsic is None:
+                attempt = sub.burned_register(
+                    wallet=w,
+                    netuid=args.netuid,
+                    wait_for_inclusion=True,
+                    wait_for_finalization=False
+                )
+            else:
+                attempt = submit_and_watch(sub, w, extrinsic, on_submitted)
+            return await asyncio.wait_for(attempt, timeout=ATTEMPT_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            log(f"burnedRegister from hotkey {w.hotkey.ss58_address[:6]}… not in a block after {ATTEMPT_TIMEOUT_S}s, giving up", "warning")
+            return False
         except Exception:
             log(f"Exception in hotkey {w.hotkey.ss58_address[:6]}…: {traceback.format_exc()}", "warning")
             return False
  
-    success = False
- 
-    while not success:
-        # calculate next target datetime based on last_reg_time_utc
-        last_dt = datetime.datetime.strptime(args.last_reg_time_utc, "%Y-%m-%d %H:%M:%S").replace(tzinfo=datetime.timezone.utc)
-        cycle_seconds = CYCLE_BLOCKS * BLOCK_TIME_S
-        target_dt = last_dt
-        now_dt = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
-        while target_dt <= now_dt:
-            target_dt += datetime.timedelta(seconds=cycle_seconds)
- 
-        start_dt = target_dt - datetime.timedelta(seconds=args.pre)
-        sleep = (start_dt - now_dt).total_seconds()
-        log(f"Next window starts {target_dt.strftime('%H:%M:%S.%f')} UTC – sleeping {sleep:.3f}s to pre-time …")
-        if sleep > 0:
-            time.sleep(sleep)
- 
-        # Log burn cost once at the beginning of this registration window
-        cost_window = current_burn_cost()
-        if cost_window is not None:
-            log(f"Burn cost for this window: {cost_window.tao} TAO")
- 
-        # Schedule exactly one registration attempt per block using different hotkeys.
-        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
-        executor = ThreadPoolExecutor(max_workers=len(wallets))
-        futures = []
- 
-        for idx, w in enumerate(wallets):
-            # Each wallet is assigned to a consecutive block: 0, 1, 2 …
-            attempt_dt = target_dt + datetime.timedelta(seconds=idx * BLOCK_TIME_S)
-            launch_dt  = attempt_dt - datetime.timedelta(seconds=args.pre)
- 
+    async def scheduled_attempt(sub: bt.AsyncSubtensor, w: bt.wallet, attempt_epoch: float) -> bool:
+        """Pre-sign and launch one wallet's attempt on its own clock.
+        Every wallet runs as its own task, so a late launch cannot push back the ones after it.
+        """
+        launch_epoch = attempt_epoch - args.pre
+        # Pre-sign outside the race so the launch only has to submit
+        prep_secs = launch_epoch - PRESIGN_LEAD_S - time.time()
+        if prep_secs > 0:
+            await asyncio.sleep(prep_secs)
+        extrinsic = await presign_register(sub, w)
+ 
+        # No collector pauses from the final sleep until the node has the tx
+        release_gc = pause_gc()
+        try:
             # Sleep until pre-launch moment for this wallet
-            now_dt_loop = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
-            sleep_secs  = (launch_dt - now_dt_loop).total_seconds()
+            sleep_secs = launch_epoch - time.time()
             if sleep_secs > 0:
-                log(f"Sleeping {sleep_secs:.3f}s before launching hotkey {w.hotkey.ss58_address[:6]}… for block {attempt_dt.strftime('%H:%M:%S.%f')}")
-                time.sleep(sleep_secs)
- 
-            log(f"Launching burnedRegister for hotkey {w.hotkey.ss58_address[:6]}… targeting block {attempt_dt.strftime('%H:%M:%S.%f')}")
-            futures.append(executor.submit(attempt_with_wallet, w, subs_for_wallets[idx]))
- 
-        # Wait until the first future succeeds (or all finish without success)
-        while futures and not success:
-            done, pending = wait(futures, timeout=1, return_when=FIRST_COMPLETED)
-            for fut in done:
+                log(f"Sleeping {sleep_secs:.3f}s before launching hotkey {w.hotkey.ss58_address[:6]}… for block {fmt_utc(attempt_epoch)}")
+                await precise_sleep_until(launch_epoch)
+ 
+            log(f"Launching burnedRegister for hotkey {w.hotkey.ss58_address[:6]}… targeting block {fmt_utc(attempt_epoch)}")
+            return await attempt_with_wallet(sub, w, extrinsic, on_submitted=release_gc)
+        finally:
+            release_gc()
+ 
+    async def run() -> bool:
+        # Single connection for informational calls and every registration attempt; keep the
+        # socket open through the idle wait between windows instead of the 5s default
+        sub = bt.AsyncSubtensor(network=args.network, websocket_shutdown_timer=cycle_seconds)
+        pin_current_thread(args.pin_core)
+        async with sub:
+            log(f"Connected to {args.network} – current block {await sub.get_current_block()}")
+ 
+            # Parse the anchor once; all window math below is plain float seconds since the epoch
+            last_epoch = calendar.timegm(time.strptime(args.last_reg_time_utc, "%Y-%m-%d %H:%M:%S"))
+            success = False
+ 
+            while not success:
+                # calculate next target time based on the last registration window
+                target_epoch = last_epoch
+                now = time.time()
+                while target_epoch <= now:
+                    target_epoch += cycle_seconds
+ 
+                # Each wallet is assigned to a consecutive block: 0, 1, 2 …
+                attempt_epochs = [target_epoch + idx * BLOCK_TIME_S for idx in range(len(wallets))]
+ 
+                sleep = attempt_epochs[0] - args.pre - PRESIGN_LEAD_S - now
+                log(f"Next window starts {fmt_utc(target_epoch)} UTC – sleeping {sleep:.3f}s to pre-time …")
+                if sleep > 0:
+                    await asyncio.sleep(sleep)
+ 
+                # Log burn cost once at the beginning of this registration window, ahead of the first launch
+                cost_window = await current_burn_cost(sub)
+                if cost_window is not None:
+                    log(f"Burn cost for this window: {cost_window.tao} TAO")
+ 
+                # Schedule exactly one registration attempt per block using different hotkeys,
+                # all spawned up-front; each task sleeps to its own launch time.
+                tasks = [
+                    asyncio.create_task(scheduled_attempt(sub, w, attempt_epochs[idx]))
+                    for idx, w in enumerate(wallets)
+                ]
+ 
+                # Wait until the first attempt succeeds (or all finish without success)
                 try:
-                    if fut.result():
-                        success = True
-                        break
+                    while tasks and not success:
+                        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            try:
+                                if task.result():
+                                    success = True
+                                    break
+                            except Exception:
+                                log(f"Unhandled attempt exception: {traceback.format_exc()}", "warning")
+                        tasks = list(pending)
+                finally:
+                    # Cancelled attempts release their GC hold on the way out
+                    for task in tasks:
+                        task.cancel()
+ 
+                # If none of the attempts succeeded, move on to next window
+                if not success:
+                    last_epoch = target_epoch
+                    log("Window complete without successful registration, preparing for next window…")
+ 
+            log("✅ burnedRegister succeeded!", "info")
+            for w in wallets:
+                try:
+                    uid = await sub.get_uid_for_hotkey_on_subnet(w.hotkey.ss58_address, args.netuid)
+                    if uid is not None:
+                        log(f"Hotkey {w.hotkey.ss58_address[:6]}… got UID {uid}")
                 except Exception:
-                    log(f"Unhandled future exception: {traceback.format_exc()}", "warning")
-            futures = list(pending)
- 
-        # Clean up executor
-        executor.shutdown(wait=False)
- 
-        # If none of the three attempts succeeded, move on to next window
-        if not success:
-            args.last_reg_time_utc = target_dt.strftime("%Y-%m-%d %H:%M:%S")
-            log("Window complete without successful registration, preparing for next window…")
- 
-    if success:
-        log("✅ burnedRegister succeeded!", "info")
-        for w in wallets:
-            try:
-                uid = sub.get_uid_for_hotkey_on_subnet(w.hotkey.ss58_address, args.netuid)
-                if uid is not None:
-                    log(f"Hotkey {w.hotkey.ss58_address[:6]}… got UID {uid}")
-            except Exception:
-                pass
-    else:
+                    pass
+        return success
+ 
+    run_loop = uvloop.run if uvloop is not None else asyncio.run
+    if not run_loop(run()):
         log("Registration failed after all attempts.", "error")
         sys.exit(1)
  